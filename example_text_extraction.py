@@ -2,8 +2,6 @@ import tesserocr
 from tools.TextExtractor import TextExtractor
 from tools.ImageCropper import ImageCropper
 from tools.ImageProcessor import ImageProcessor
-import os
-import cv2
 
 if __name__ == '__main__':
     # Set up the paths to the files
@@ -37,7 +35,7 @@ if __name__ == '__main__':
 
 
         """2) You can also extract text from a single image
-        It should be noted that if get_data=True, the returned value will be a list of dictionaries. If you want to print
+        It should be noted that if get_data=True, the returned value will be a list of Word named tuples. If you want to print
         the coordinate data, you have to use the print_results=True argument (or figure out how to print it yourself).
         You could also use the convert_coord_data_to_text method in the TextExtractor class."""
         # UNCOMMENT THE LINES BELOW
@@ -80,9 +78,13 @@ if __name__ == '__main__':
         # cropped_images = cropper(clean_img)
         
         # # Don't use TextExtractor.get_text for this because it will try to clean the images again.
-        # text = ""
-        # for img in cropped_images:
-        #     api.SetImage(img)
-        #     text += api.GetUTF8Text()
-        
-        # print(text)        
+        # # get_texts_batch skips the cleaning step and extracts the text of every segment in one call.
+        # text = "".join(text_extractor.get_texts_batch(cropped_images))
+
+        # print(text)
+
+        # # If the text from tesseract's first pass is good enough, get_tess_auto_segments can return the text of each
+        # # segment along with its coordinates, which skips running tesseract on every cropped segment again.
+        # segments = cropper.get_tess_auto_segments(clean_img, api, return_text=True)
+        # text = "".join(segment_text for coordinates, segment_text in segments)
+        # print(text)
@@ -5,6 +5,11 @@
 
 from tesserocr import RIL, PSM, iterate_level
 from PIL import Image
+import numpy as np
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 class ImageCropper():
     """
@@ -23,7 +28,8 @@ class ImageCropper():
     
     """
     def __init__(self):
-        self.segment_coordinates = []
+        # Insertion ordered set of the segment coordinates, so the same segment is never cropped twice
+        self.segment_coordinates = {}
 
     def __call__(self, image):
         """
@@ -44,19 +50,44 @@ class ImageCropper():
         a list. The images will be cropped based on the coordinates provided to the add_segment(), and
         add_multiple_segments(), as well as the coordinates retrieved fromget_tess_auto_segments().
         Useful for extracting text from specific areas of an image, improving the accuracy of the text extraction.
+        Each segment is copied into a grayscaled PIL image once, which TextExtractor hands to tesseract as raw bytes.
+        Use crop() instead to get the segments as numpy views of the image, without copying any pixels.
         """
-        image = Image.fromarray(image)
-        segments = []
+        return [Image.fromarray(segment) for segment in self.crop(image).values()]
+
+    def crop(self, image):
+        """
+        Parameters
+        ----------
+        image : numpy.ndarray
+            The grayscaled image to crop. PIL images are also accepted and will be converted to a numpy.ndarray once.
+
+        Returns
+        -------
+        segments : dict<tuple, numpy.ndarray>
+            A dictionary that maps the coordinates of each segment to the cropped portion of the image.
+
+        Description
+        -----------
+        Grabs the cropped portions of the image for each of the coordinates that have been added to the cropper.
+        The crops are numpy slices of the original image, so no pixel data is copied. This means that changing a
+        segment will also change the original image. If a copy is needed, call the segment's copy() method.
+        Coordinates are in the (left, top, right, bottom) form used by PIL, and any coordinates that fall outside of
+        the image are clipped to the image borders.
+        """
+        image = np.asarray(image)
+        segments = {}
         for coordinates in self.segment_coordinates:
-            # Crop the image based on the coordinates
-            segment = image.crop(coordinates)
-            segments.append(segment)
+            left, top, right, bottom = coordinates
+            # Clip negative coordinates to 0, since numpy would otherwise treat them as indices from the end
+            segments[coordinates] = image[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)]
         return segments
     
     def add_segment(self, coordinates):
         """Takes a tuple or list of coordinates and adds them to the list of segment coordinates that will be used to
-        cut the image into segments."""
-        self.segment_coordinates.append(tuple(coordinates))
+        cut the image into segments. Coordinates that have already been added are ignored."""
+        coordinates = coordinates if type(coordinates) is tuple else tuple(coordinates)
+        self.segment_coordinates[coordinates] = None
     
     def add_multiple_segments(self, coordinates_list):
         """Takes a list of coordinates in the form of tuples or lists and adds them to the list of segment coordinates
@@ -66,9 +97,9 @@ class ImageCropper():
     
     def clear_segments(self):
         """Clears all the segment coordinates that have been added to the list of segment coordinates."""
-        self.segment_coordinates = []
+        self.segment_coordinates = {}
 
-    def get_tess_auto_segments(self, image, api, level=RIL.BLOCK):
+    def get_tess_auto_segments(self, image, api, level=RIL.BLOCK, return_text=False):
         """
         Parameters
         ----------
@@ -79,41 +110,67 @@ class ImageCropper():
             The levels are defined in the tesserocr library and are used to extract specific segments of the image.
         api : tesserocr.PyTessBaseAPI
             The tesserocr API object to use to analyze the layout of the image.
+        return_text : bool, optional
+            Whether to also recognize the text of each segment while the layout is being analyzed. The default is
+            False, which only analyzes the layout.
 
         Returns
         -------
-        images : list<PIL.Image>
-            A list of images that contain the extracted text segments. These should be much more accurate than just
-            feeding the entire image to tesseract.
+        coordinates : list<list> OR list<tuple>
+            -- If return_text is False, a list of the coordinates of the automatically detected text segments.
+            -- If return_text is True, a list of (coordinates, text) tuples, where text is the text tesseract
+            recognized in that segment.
         
         Description
         -----------
         This function uses the tesserocr library to analyze the layout of the image and find the coordinates of the 
-        text segments that are automatically detected by tesseract.
+        text segments that are automatically detected by tesseract. The coordinates are added to the cropper, so
+        calling the cropper afterwards will return images of the segments. These should be much more accurate than
+        just feeding the entire image to tesseract.
+
+        If return_text is True, tesseract recognizes the whole page once and the text of each segment is read off of
+        that same pass. This avoids having to crop the segments and run tesseract on each of them again when the text
+        from the first pass is good enough.
         """
         # Convert the image to a PIL image
         image = Image.fromarray(image)
 
-        # Set the image to the tesserocr API
-        api.SetPageSegMode(PSM.AUTO_ONLY)
+        # Set the image to the tesserocr API. Recognizing the text requires a mode that runs the OCR engine.
+        api.SetPageSegMode(PSM.AUTO if return_text else PSM.AUTO_ONLY)
         api.SetImage(image)
 
-        # Analyze the layout of the image
-        layout = api.AnalyseLayout()
-        if layout is None:
-            print("No layout found. Exiting.")
-            return []
-
         coordinates = []
-        for block in iterate_level(layout, level):
-            # Get the bounding box of the text block
-            bbox = block.BoundingBox(level)
-            if bbox:  # Ensure the bounding box is valid
-                # Expand the bounding box slightly to ensure the text block is fully captured
-                bbox = [bbox[0]-5, bbox[1]-5, bbox[2]+5, bbox[3]+5]
+        texts = []
+        if return_text:
+            # Recognize the text, which also analyzes the layout of the image
+            api.Recognize()
+            layout = api.GetIterator()
+            if layout is None:
+                logger.warning("No layout found. Exiting.")
+                api.SetPageSegMode(PSM.AUTO)
+                return []
 
-                coordinates.append(bbox)
+            for block in iterate_level(layout, level):
+                # Get the bounding box of the text block
+                bbox = block.BoundingBox(level)
+                if bbox:  # Ensure the bounding box is valid
+                    # Expand the bounding box slightly to ensure the text block is fully captured
+                    coordinates.append([bbox[0]-5, bbox[1]-5, bbox[2]+5, bbox[3]+5])
+                    texts.append(block.GetUTF8Text(level))
+        else:
+            # Analyze the layout of the image and get the bounding boxes of every text segment in one call
+            components = api.GetComponentImages(level, True)
+            if not components:
+                logger.warning("No layout found. Exiting.")
+                api.SetPageSegMode(PSM.AUTO)
+                return []
+
+            for _, box, _, _ in components:
+                # Expand the bounding box slightly to ensure the text block is fully captured
+                coordinates.append([box['x']-5, box['y']-5, box['x']+box['w']+5, box['y']+box['h']+5])
             
         self.add_multiple_segments(coordinates)
         api.SetPageSegMode(PSM.AUTO)
-        return coordinates
\ No newline at end of file
+        if return_text:
+            return list(zip(coordinates, texts))
+        return coordinates
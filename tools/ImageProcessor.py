@@ -6,21 +6,72 @@
 import numpy as np
 import cv2
 import os
+import sys
+import logging
+import hashlib
+import functools
+import queue
+import tempfile
+import threading
 from argparse import ArgumentParser
-from skimage.transform import rotate
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from deskew import determine_skew
 
+# The helpers shared with TextExtractor. Relative when imported as part of the tools package, and absolute when this
+# file is run as a script.
+try:
+    from .threading_tools import put_until_stopped, write_queued_items
+except ImportError:
+    from threading_tools import put_until_stopped, write_queued_items
+
+
+logger = logging.getLogger(__name__)
+
+# OCR_CV2_THREADS sets the number of threads OpenCV uses in every process that imports this module, which is useful
+# when the processor is run from a pool of worker processes (0 or 1 turns off OpenCV's own threads)
+if os.environ.get('OCR_CV2_THREADS'):
+    cv2.setNumThreads(int(os.environ['OCR_CV2_THREADS']))
+
+# The file extensions of the images that clean_image_dir will clean
+VALID_IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg', '.jpe', '.webp', '.bmp', '.dib', '.tiff', '.tif', '.pxm', '.pgm',
+                              '.pbm', '.pnm'})
+# The file extensions of the images that can hold more than one page
+MULTI_PAGE_IMAGE_EXTS = frozenset({'.tiff', '.tif'})
+
+
 class ImageProcessor:
     """
     This class provides a place to configure every OCR relevant image preprocessing step to be applied to an image.
     The class is callable, so it can be used as a function to apply the preprocessing steps to an image. The class is 
     set up to have defaults for each preprocessing step, so it will apply very basic preprocessing steps. Every
-    preprocessing step is uses OpenCV functions, except for the deskew function, which uses the deskew library.
+    preprocessing step uses OpenCV functions, except for the skew detection, which uses the deskew library.
     It is not advised to apply too many preprocessing steps to an image, as many of the steps are not meant to be combined.
+    The gaussian_blur step is still applied when it is combined with one of the adaptive thresholds. The adaptive
+    thresholds compare each pixel to a weighted mean of its neighborhood, but they do not smooth the pixel itself, so a
+    blur before them changes the result instead of repeating work the threshold already does.
+    The skew of large images is detected on a smaller copy of the image, which is halved with cv2.pyrDown for as long
+    as its shorter side stays at least deskew_detection_size pixels long. The skew of a page of text is just as clear at
+    that size, and detecting it takes a fraction of the time. The rotation is still applied to the full size image. Set
+    deskew_detection_size to None to always detect the skew at full size.
     First initialize the class with the desired preprocessing steps, then call the class with an image to apply those
     preprocessing steps to the image.
     Those who wish to configure the parameters are assumed to understand cv2 image processing methods and how to use
     them.
+    If a cache_dir is provided, every processed image is saved to that directory under a hash of the input image and
+    the configuration of the processor. Calling the processor again on the same image with the same configuration will
+    load the saved result instead of processing the image again, which saves time when tuning the rest of an OCR
+    pipeline on the same files.
+    If cv2_threads is provided, the number of threads OpenCV uses is set to it every time the processor is called.
+    Set it to 1 when the processor is called from many worker processes at once (clean_image_dir already does this for
+    its workers), so each process does not start a thread per CPU. Leave it as None when images are processed one at a
+    time, so OpenCV can use every CPU for each image.
+    If device is 'cuda', the denoising and bilateral filter steps are run on the GPU with OpenCV's CUDA module. The image
+    is uploaded to the GPU once before those steps and downloaded once after them, and every other step still runs on
+    the CPU. The CUDA versions of those steps do not give exactly the same results as the CPU versions. If OpenCV was
+    built without CUDA support or no CUDA device is found, the steps are run on the CPU instead.
+    If device is 'ocl', the image is wrapped in a cv2.UMat so that OpenCV can run every step on an OpenCL device, such
+    as an integrated GPU. The image is only copied back to the CPU for the skew detection, which uses the deskew
+    library, and at the end. If OpenCL is not available, the image is processed on the CPU instead.
     """
     def __init__(
                 self,
@@ -29,6 +80,7 @@ class ImageProcessor:
                 normalize_args: dict = {"alpha": 0, "beta": 255, "norm_type": cv2.NORM_MINMAX},
                 sharpen: bool = False,
                 deskew: bool = True,
+                deskew_detection_size: int = 1000,
                 denoise: bool = True,
                 denoise_args: dict = {"h": 10, "templateWindowSize": 7, "searchWindowSize": 21},
                 bilateral_filter: bool = False,
@@ -47,13 +99,17 @@ class ImageProcessor:
                 dilate: bool = False,
                 dilation_args: dict = {"kernel_size": (1,1), "iterations": 1},
                 morphology: bool = False,
-                morphology_args: dict = {"kernel_size": (1,1), "op": cv2.MORPH_OPEN}
+                morphology_args: dict = {"kernel_size": (1,1), "op": cv2.MORPH_OPEN},
+                cache_dir: str = None,
+                cv2_threads: int = None,
+                device: str = 'cpu'
                 ):
         self.grayscale_conversion_type = grayscale_conversion_type
         self.normalize = normalize
         self.normalize_args = normalize_args
         self.sharpen = sharpen
         self.deskew = deskew
+        self.deskew_detection_size = deskew_detection_size
         self.denoise = denoise
         self.denoise_args = denoise_args
         self.bilateral_filter = bilateral_filter
@@ -73,73 +129,400 @@ class ImageProcessor:
         self.dilation_args = dilation_args
         self.morphology = morphology
         self.morphology_args = morphology_args
-        
+        self.cache_dir = cache_dir
+        self.cv2_threads = cv2_threads
+        self.device = device
+        if device == 'cuda' and not _cuda_available():
+            logger.warning('No CUDA device is available to OpenCV, so the images will be processed on the CPU')
+        elif device == 'ocl' and not _opencl_available():
+            logger.warning('OpenCL is not available to OpenCV, so the images will be processed on the CPU')
+        # The kernels of the morphological steps, by kernel size, so each one is only built once
+        self._kernels = {}
+        # Only warn about color images being passed in once
+        self._warned_color_input = False
+
     def __call__(self, image):
+        if self.cv2_threads is not None:
+            cv2.setNumThreads(self.cv2_threads)
+
+        if self.cache_dir is None:
+            return self.process(image)
+        return self._process_cached(image)
+
+    def _process_cached(self, image):
+        """Processes the image, using the result saved in the cache_dir when there is one and saving it otherwise."""
+        # Look for a cached result of processing this exact image with this exact configuration
+        cache_path = os.path.join(self.cache_dir, self._cache_key(image) + '.png')
+        if os.path.exists(cache_path):
+            cached_image = cv2.imread(cache_path, cv2.IMREAD_UNCHANGED)
+            if cached_image is not None:
+                return cached_image
+
+        image = self.process(image)
+        self._save_to_cache(cache_path, image)
+        return image
+
+    def _save_to_cache(self, cache_path, image):
+        """Saves a processed image to cache_path, by writing it to a temporary file in cache_dir and then moving that
+        file into place in one step. An interrupted run, or several processes sharing the cache_dir, then never leave
+        a partly written image behind to be loaded as a cached result."""
+        success, data = cv2.imencode('.png', image)
+        if not success:
+            # The image is still returned, it just cannot be cached
+            logger.warning(f'Could not encode the processed image to save it to {cache_path}')
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data.tobytes())
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def batch(self, images, workers=1):
+        """
+        Parameters
+        ----------
+        images : list<numpy.ndarray>
+            The images to preprocess.
+        workers : int, optional
+            The number of threads to preprocess the images with. The default is 1, which preprocesses the images one
+            at a time in the calling thread.
+
+        Returns
+        -------
+        processed_images : list<numpy.ndarray>
+            The preprocessed images, in the same order as the images were provided.
+
+        Description
+        -----------
+        This function applies the configured preprocessing steps to every image in a batch, the same as calling the
+        processor on each of them. The OpenCV thread count is only set once for the whole batch. OpenCV releases the
+        GIL while it works, so with more than one worker the steps of different images run at the same time. This
+        helps most with many small images, such as cropped segments, where a single image is too small for OpenCV to
+        spread its work over every CPU. Each image is still processed separately, since deskewing gives every image
+        its own size.
+        """
+        if self.cv2_threads is not None:
+            cv2.setNumThreads(self.cv2_threads)
+
+        # The thread count is already set, so skip __call__ and only go through the cache when there is one
+        process = self.process if self.cache_dir is None else self._process_cached
+        if workers <= 1 or len(images) < 2:
+            return [process(image) for image in images]
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(images))) as executor:
+            return list(executor.map(process, images))
+
+    def _cache_key(self, image):
+        """Returns a hash of the image's pixels and the processor's public configuration, used to name the cached
+        result of processing the image."""
+        image = np.ascontiguousarray(image)
+        # The cache and thread settings do not change the processed image, so they are left out of the key
+        config = {key: value for key, value in vars(self).items()
+                  if not key.startswith('_') and key not in ('cache_dir', 'cv2_threads')}
+        key = hashlib.blake2b(digest_size=16)
+        key.update(repr((image.shape, image.dtype.str, config)).encode())
+        key.update(image.data)
+        return key.hexdigest()
+
+    def _kernel(self, kernel_size):
+        """Returns a rectangular kernel of ones with the shape kernel_size, building it the first time it is used. The
+        kernels are looked up by size on every call, so changing the args of a step after initialization still works."""
+        kernel_size = tuple(kernel_size)
+        kernel = self._kernels.get(kernel_size)
+        if kernel is None:
+            kernel = self._kernels[kernel_size] = np.ones(kernel_size, np.uint8)
+        return kernel
+
+    def _skew_detection_image(self, image):
+        """Returns the image halved in size for as long as its shorter side stays at least deskew_detection_size, for
+        detecting its skew on."""
+        if not self.deskew_detection_size:
+            return image
+        while min(image.shape[:2]) // 2 >= self.deskew_detection_size:
+            image = cv2.pyrDown(image)
+        return image
+
+    def _denoise_on_gpu(self, image):
+        """Applies the configured denoising and bilateral filter steps to the image on the GPU, uploading and
+        downloading the image only once."""
+        gpu_image = cv2.cuda_GpuMat()
+        gpu_image.upload(image)
+
+        if self.denoise:
+            # The CUDA version takes the same arguments as the CPU version, just positionally and in another order
+            args = self.denoise_args
+            gpu_image = cv2.cuda.fastNlMeansDenoising(gpu_image, args.get('h', 3), None,
+                                                      args.get('searchWindowSize', 21),
+                                                      args.get('templateWindowSize', 7))
+
+        if self.bilateral_filter:
+            args = self.bilateral_filter_args
+            gpu_image = cv2.cuda.bilateralFilter(gpu_image, args['d'], args['sigmaColor'], args['sigmaSpace'])
+
+        return gpu_image.download()
+
+    def process(self, image):
+        """Applies the configured preprocessing steps to the image and returns the processed image. Unlike calling the
+        processor, this never reads from or writes to the cache."""
+        # The steps that can work in place write their result over the intermediate image made by an earlier step
+        # instead of allocating a new one, but they must never write over the image that was passed in. The denoising
+        # and bilateral filter steps always need a separate output image, so they still allocate one.
+        input_image = image
+
+        # Every OpenCV step accepts and returns a UMat, which keeps the image on the OpenCL device between the steps
+        use_opencl = self.device == 'ocl' and _opencl_available()
+        if use_opencl:
+            image = cv2.UMat(image)
+
         if self.grayscale_conversion_type is not None:
             image = cv2.cvtColor(image, self.grayscale_conversion_type)
+        elif np.ndim(input_image) == 3 and not self._warned_color_input:
+            # Decoding straight to grayscale (cv2.IMREAD_GRAYSCALE) is cheaper than converting here, and the
+            # thresholding steps only accept single channel images
+            logger.warning('ImageProcessor was given a color image without a grayscale_conversion_type. Decode '
+                           'images as grayscale, or set grayscale_conversion_type to convert them.')
+            self._warned_color_input = True
         
         if self.normalize:
-            image = cv2.normalize(image, None, **self.normalize_args)
+            image = cv2.normalize(image, None if image is input_image else image, **self.normalize_args)
 
         if self.sharpen:
-            kernel = np.array([[-1, -1, -1],
-                                [-1, 9, -1],
-                                [-1, -1, -1]])
-            cv2.filter2D(image, -1, kernel)
+            # Sharpening with the kernel [[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]] is the same as 10 times the image
+            # minus the sum of each 3x3 neighborhood. The sums are taken with an unnormalized box filter in 16 bits,
+            # which cannot overflow, and then combined and saturated back to 8 bits in one pass.
+            neighborhood_sums = cv2.boxFilter(image, cv2.CV_16S, (3, 3), normalize=False)
+            image = cv2.addWeighted(image, 10, neighborhood_sums, -1, 0, dtype=cv2.CV_8U)
 
         if self.deskew:
-            # Determine the angle of rotation needed to deskew the image
-            angle = determine_skew(image)
+            # Determine the angle of rotation needed to deskew the image. determine_skew only accepts numpy arrays.
+            pixels = image.get() if use_opencl else image
+            angle = determine_skew(self._skew_detection_image(pixels))
     
-            # Apply the rotation to the image, and convert it back to a uint8 image
-            image = (rotate(image, angle, resize=True, cval=1)*255).astype(np.uint8)
+            # Apply the rotation to the image. determine_skew returns None when no skew could be detected.
+            if angle:
+                image = rotate_image(pixels, angle)
+                if use_opencl:
+                    image = cv2.UMat(image)
         
-        if self.denoise:
-            image = cv2.fastNlMeansDenoising(image, None, **self.denoise_args)
+        if (self.denoise or self.bilateral_filter) and self.device == 'cuda' and _cuda_available():
+            image = self._denoise_on_gpu(image)
+        else:
+            if self.denoise:
+                image = cv2.fastNlMeansDenoising(image, None, **self.denoise_args)
 
-        if self.bilateral_filter:
-            image = cv2.bilateralFilter(image, **self.bilateral_filter_args)
+            if self.bilateral_filter:
+                image = cv2.bilateralFilter(image, **self.bilateral_filter_args)
         
         if self.global_binarize:
             args = self.global_binarize_args
-            image = cv2.threshold(image, args.threshold, args.maxval, cv2.THRESH_BINARY)[1]
+            image = cv2.threshold(image, args['threshold'], args['maxval'], args.get('type', cv2.THRESH_BINARY),
+                                  dst=None if image is input_image else image)[1]
 
         if self.gaussian_blur:
-            image = cv2.GaussianBlur(image, **self.gaussian_blur_args)
+            image = cv2.GaussianBlur(image, dst=None if image is input_image else image, **self.gaussian_blur_args)
         
         if self.otsu_threshold:
             args = self.otsu_threshold_args
-            image = cv2.threshold(image, args.threshold, args.maxval, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            image = cv2.threshold(image, args['threshold'], args['maxval'], cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                                  dst=None if image is input_image else image)[1]
         
         if self.adaptive_mean_threshold:
             args = self.adaptive_threshold_args
-            image = cv2.adaptiveThreshold(image, args.maxval, cv2.ADAPTIVE_THRESH_MEAN_C, 
-                                          cv2.THRESH_BINARY,args.blockSize, args.C)
+            image = cv2.adaptiveThreshold(image, args['maxval'], cv2.ADAPTIVE_THRESH_MEAN_C,
+                                          cv2.THRESH_BINARY, args['blockSize'], args['C'],
+                                          dst=None if image is input_image else image)
             
         if self.adaptive_gaussian_threshold:
             args = self.adaptive_threshold_args
-            image = cv2.adaptiveThreshold(image, args.maxval, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                          cv2.THRESH_BINARY,args.blockSize, args.C)
+            image = cv2.adaptiveThreshold(image, args['maxval'], cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                          cv2.THRESH_BINARY, args['blockSize'], args['C'],
+                                          dst=None if image is input_image else image)
         
         if self.erode:
-            kernel_size = self.erosion_args.kernel_size
-            kernel = np.ones(kernel_size, np.uint8)
-            image = cv2.erode(image, kernel, iterations=self.erosion_args.iterations)
+            kernel = self._kernel(self.erosion_args['kernel_size'])
+            image = cv2.erode(image, kernel, dst=None if image is input_image else image,
+                              iterations=self.erosion_args['iterations'])
         
         if self.dilate:
-            kernel_size = self.erosion_args.kernel_size
-            kernel = np.ones(kernel_size, np.uint8)
-            image = cv2.dilate(image, kernel, iterations=self.erosion_args.iterations)
+            kernel = self._kernel(self.dilation_args['kernel_size'])
+            image = cv2.dilate(image, kernel, dst=None if image is input_image else image,
+                               iterations=self.dilation_args['iterations'])
         
         if self.morphology:
-            kernel_size = self.morphology_args.kernel_size
-            kernel = np.ones(kernel_size, np.uint8)
-            image = cv2.morphologyEx(image, self.morphology_args.op, kernel)
+            kernel = self._kernel(self.morphology_args['kernel_size'])
+            image = cv2.morphologyEx(image, self.morphology_args['op'], kernel,
+                                     dst=None if image is input_image else image)
 
-        return image
+        return image.get() if use_opencl else image
+
+
+@functools.lru_cache(maxsize=None)
+def _cuda_available():
+    """Returns whether OpenCV was built with CUDA support and can find a CUDA device. Only checked once per process."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _opencl_available():
+    """Returns whether OpenCV can use an OpenCL device, and turns on its use of OpenCL if it can. Only checked once per
+    process."""
+    if not cv2.ocl.haveOpenCL():
+        return False
+    cv2.ocl.setUseOpenCL(True)
+    return True
+
+
+def rotate_image(image, angle):
+    """
+    Parameters
+    ----------
+    image : numpy.ndarray
+        The uint8 image to rotate.
+    angle : float
+        The angle to rotate the image by, in degrees. Positive values rotate the image counter-clockwise.
 
+    Returns
+    -------
+    rotated : numpy.ndarray
+        The rotated uint8 image.
 
-def clean_image_dir(directory, output_path):
+    Description
+    -----------
+    This function rotates an image around its center and resizes the canvas so that none of the image is cut off.
+    The area of the new canvas that is not covered by the original image is filled with white. The rotation is done
+    in a single pass with cv2.warpAffine directly on the uint8 image.
+    """
+    h, w = image.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+
+    # Compute the size of the canvas needed to fit the whole rotated image
+    cos, sin = abs(M[0, 0]), abs(M[0, 1])
+    new_w = int(h * sin + w * cos)
+    new_h = int(h * cos + w * sin)
+
+    # Shift the rotation so the image is centered on the new canvas
+    M[0, 2] += new_w / 2 - w / 2
+    M[1, 2] += new_h / 2 - h / 2
+
+    return cv2.warpAffine(image, M, (new_w, new_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT,
+                          borderValue=(255, 255, 255))
+
+
+def _read_grayscale_image(input_path):
+    """Reads the file at input_path into memory in one call and decodes it as a grayscaled image. Unlike cv2.imread,
+    this also works with non-ASCII paths on Windows. Returns None if the file cannot be read or decoded."""
+    try:
+        data = np.fromfile(input_path, dtype=np.uint8)
+    except OSError:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+
+
+def _read_grayscale_pages(input_path):
+    """Reads every page of the file at input_path as a list of grayscaled images. All the pages of a TIFF file are
+    decoded in one call, and every other file has a single page. The list is empty if the file cannot be read or
+    decoded."""
+    if os.path.splitext(input_path)[1].lower() not in MULTI_PAGE_IMAGE_EXTS:
+        image = _read_grayscale_image(input_path)
+        return [image] if image is not None else []
+
+    try:
+        data = np.fromfile(input_path, dtype=np.uint8)
+    except OSError:
+        return []
+    success, pages = cv2.imdecodemulti(data, cv2.IMREAD_GRAYSCALE)
+    return list(pages) if success else []
+
+
+def _save_pages(output_file, pages):
+    """Saves the pages of a cleaned image to output_file, as a multi-page TIFF when there is more than one page."""
+    if len(pages) == 1:
+        cv2.imwrite(output_file, pages[0])
+    else:
+        cv2.imwritemulti(output_file, pages)
+
+
+def _clean_image_file(clean_image_func, input_path, output_file):
+    """Reads every page of the grayscaled image at input_path, cleans them with clean_image_func, and saves them to
+    output_file."""
+    pages = _read_grayscale_pages(input_path)
+    if not pages:
+        logger.warning(f'Could not read the image {input_path}.')
+        return
+    _save_pages(output_file, [clean_image_func(page) for page in pages])
+
+
+def _clean_images_pipelined(clean_image_func, output_files):
+    """Cleans every image in output_files, a dict that maps the path of each image to the path to save it to, in the
+    current process. The images are read by one background thread and saved by another, so reading and saving the
+    images overlaps with cleaning them."""
+    # Keep the queues small, so only a few images are held in memory at once
+    read_queue = queue.Queue(maxsize=8)
+    write_queue = queue.Queue(maxsize=8)
+    stop = threading.Event()
+    write_errors = []
+    reader = threading.Thread(target=_read_images, args=(list(output_files), read_queue, stop), daemon=True)
+    writer = threading.Thread(target=write_queued_items, args=(write_queue, _save_pages, write_errors), daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            item = read_queue.get()
+            if item is None:
+                break
+            input_path, pages = item
+            # Skip the files that could not be read, instead of stopping the whole directory
+            if not pages:
+                logger.warning(f'Could not read the image {input_path}.')
+                continue
+            write_queue.put((output_files[input_path], [clean_image_func(page) for page in pages]))
+    finally:
+        # Stop the reader if cleaning failed, and wait for every cleaned image to be saved
+        stop.set()
+        write_queue.put(None)
+        writer.join()
+        reader.join()
+
+    if write_errors:
+        raise write_errors[0]
+
+
+def _read_images(input_paths, read_queue, stop):
+    """Reads the pages of the grayscaled image at each of input_paths and puts (input_path, pages) in read_queue,
+    followed by None. Used as the reader thread of _clean_images_pipelined. Stops early once stop is set."""
+    for input_path in input_paths + [None]:
+        item = (input_path, _read_grayscale_pages(input_path)) if input_path is not None else None
+        if not put_until_stopped(read_queue, item, stop):
+            return
+
+
+# The ImageProcessor used by a clean_image_dir worker process, built once by _init_worker
+_worker_processor = None
+
+
+def _init_worker():
+    """Builds the basic ImageProcessor that a clean_image_dir worker process uses for every image it is given."""
+    global _worker_processor
+    # The images are already spread over one worker per CPU, so OpenCV should not also start a thread per CPU in
+    # every worker
+    cv2.setNumThreads(1)
+    _worker_processor = ImageProcessor() # Initialize the basic ImageProcessor
+
+
+def _clean_image_file_in_worker(input_path, output_file):
+    """Cleans and saves an image using the worker process' ImageProcessor."""
+    _clean_image_file(_worker_processor, input_path, output_file)
+
+
+def clean_image_dir(directory, output_path, workers=None):
     """
     Parameters
     ----------
@@ -147,6 +530,9 @@ def clean_image_dir(directory, output_path):
         The path to the directory containing the images to clean.
     output_path : str
         The path to the directory to save the cleaned images to.
+    workers : int, optional
+        The number of worker processes to clean the images with. The default is None, which uses one worker per CPU.
+        Setting this to 1 will clean the images one at a time in the current process.
     
     Returns
     -------
@@ -156,44 +542,52 @@ def clean_image_dir(directory, output_path):
     -----------
     This function cleans all the images in a directory and saves them to a new directory. The 'cleaning' done to the
     images are defined in the clean_image function. The images are saved with the same name as the original image with
-    an added '_cleaned' to the end of the name.
+    an added '_cleaned' to the end of the name. Every page of a multi-page TIFF is cleaned, and the cleaned pages are
+    saved together in a single multi-page TIFF. Files that cannot be read as images are logged and skipped.
+
+    Every image is cleaned independently, so the images are spread across a pool of worker processes. Each worker
+    builds its ImageProcessor once, and reads, cleans and saves the images it is given itself, so no images are sent
+    between processes. If there are fewer than two images to clean, the pool is skipped to avoid the cost of starting
+    the worker processes. When the images are cleaned in the current process, they are read and saved by background
+    threads, so only the cleaning has to wait for the images to be read.
     """
     # Create a directory to store the cleaned images
     os.makedirs(output_path, exist_ok=True)
 
-    # Get the list of images in the directory
-    images = os.listdir(directory)
-    
-    # Prepare list of valid image formats
-    valid_image_formats = ['.png', '.jpg', '.jpeg', '.jpe', '.webp', '.bmp', '.webp'
-                           '.dib','.tiff', '.tif', '.pxm', '.pgm', '.pbm', '.pnm']
-
-    # Loop through the images in the directory
-    for image_name in images:
-        # Check that the file is not a directory
-        if os.path.isdir(os.path.join(directory, image_name)):
-            continue
-        
-        # Check that the file is a valid image format
-        if not any(image_name.endswith(ext) for ext in valid_image_formats):
-            print(f'Invalid image format: {image_name}')
-            continue
-        
-        # Clean and save the image to the output directory
-        input_path = os.path.join(directory, image_name)
+    # Map the path of each image to clean to the path its cleaned version will be saved to
+    output_files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            # Check that the file is not a directory. The file type is known from the directory listing itself.
+            if not entry.is_file():
+                continue
 
-        # Read the image
-        image = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
-        clean_image_func = ImageProcessor() # Initialize the basic ImageProcessor
-        cleaned_image = clean_image_func(image)
-        
-        # Give the cleaned image the same name as the original image with '_cleaned' added to the end
-        new_name = os.path.splitext(image_name)[0] + '_cleaned' + os.path.splitext(image_name)[1]
-        # Save the cleaned image
-        output_file = os.path.join(output_path, new_name)
-        cv2.imwrite(output_file, cleaned_image)
+            # Check that the file is a valid image format
+            name, ext = os.path.splitext(entry.name)
+            if ext.lower() not in VALID_IMAGE_EXTS:
+                logger.warning(f'Invalid image format: {entry.name}')
+                continue
+
+            # Give the cleaned image the same name as the original image with '_cleaned' added to the end
+            output_files[entry.path] = os.path.join(output_path, name + '_cleaned' + ext)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(output_files) < 2:
+        # Clean the images one at a time, while the next images are read and the cleaned ones are saved
+        _clean_images_pipelined(ImageProcessor(), output_files) # Use the basic ImageProcessor
+    else:
+        workers = min(workers, len(output_files))
+        # Send the images to the workers in chunks, about 4 per worker, to cut down on the messages between processes
+        chunksize = max(1, len(output_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            # Consume the results so an error in any of the workers is raised here
+            for _ in executor.map(_clean_image_file_in_worker, output_files.keys(), output_files.values(),
+                                  chunksize=chunksize):
+                pass
     
-    print('Images cleaned and saved to ' + output_path)
+    logger.info('Images cleaned and saved to ' + output_path)
     
 
 if __name__ == "__main__":
@@ -203,18 +597,24 @@ if __name__ == "__main__":
     group.add_argument('-i', '--image', help='Path to the image file')
     group.add_argument('-d', '--directory', help='Path to the directory of images')
     parser.add_argument('-o', '--output', help='Path to the output directory', required=True)
+    parser.add_argument('-w', '--workers', type=int, help='Number of processes to clean a directory of images with')
     args = parser.parse_args()
 
+    logging.basicConfig(format='%(message)s', level=logging.INFO, stream=sys.stderr)
     
     # Clean either a single image and display it, or clean a directory of images and save them to a new directory
     if args.image:
-        image = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+        # Decode the image straight to grayscale, which is cheaper than decoding it in color and converting it
+        image = _read_grayscale_image(args.image)
+        if image is None:
+            logger.error(f'Could not read the image: {args.image}')
+            exit(1)
         clean_image = ImageProcessor() # Initialize the ImageProcessor and turn off grayscaling
         cleaned_image = clean_image(image)
         
-        print(args.output, args.image)
+        logger.info(f'Saving the cleaned {args.image} to {args.output}')
         cv2.imwrite(args.output, cleaned_image)
 
     elif args.directory:
-        clean_image_dir(args.directory, args.output)
+        clean_image_dir(args.directory, args.output, workers=args.workers)
     
@@ -3,13 +3,59 @@
 # This file contains a class to extract text from images and PDFs using the tesserocr library.
 
 import tesserocr
-from tesserocr import PSM
-from PIL import Image
-from pdf2image import convert_from_path
+from tesserocr import PSM, OEM
+from PIL import Image, ImageSequence
+from pdf2image import convert_from_path, pdfinfo_from_path
 import cv2
 import time
 import numpy as np
 import os
+import sys
+import logging
+import hashlib
+import json
+import queue
+import tempfile
+import ctypes
+import ctypes.util
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat, islice, chain
+
+# The helpers shared with clean_image_dir in ImageProcessor. Relative when imported as part of the tools package, and absolute when this
+# file is run as a script.
+try:
+    from .threading_tools import put_until_stopped, write_queued_items
+except ImportError:
+    from threading_tools import put_until_stopped, write_queued_items
+
+
+# Status messages are logged instead of printed, so they can be silenced and kept apart from the extracted text
+logger = logging.getLogger(__name__)
+
+# The data extracted for each word by get_coordinate_data. A tuple takes far less memory than a dictionary per word,
+# and the fields can still be read by name (word.text) or converted with word._asdict().
+Word = namedtuple('Word', ['left', 'top', 'right', 'bottom', 'conf', 'text'])
+
+# The header row of the word data text, naming the fields of each Word
+COORD_DATA_HEADER = 'left\ttop\tright\tbottom\tconf\ttext\n'
+
+# The file extensions of the single image and multi-frame TIFF files that can be read by default
+IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg', '.jpe', '.webp', '.bmp', '.dib', '.pxm', '.pgm', '.pbm', '.pnm'})
+TIFF_EXTS = frozenset({'.tif', '.tiff'})
+# Every file extension that text can be extracted from
+ACCEPTED_FILE_EXTS = IMAGE_EXTS | TIFF_EXTS | {'.pdf'}
+# The number of poppler processes that rasterize the pages of a PDF. More than 8 rarely helps, since the pages still
+# have to be read back through pipes one at a time.
+PDF_THREAD_COUNT = min(os.cpu_count() or 1, 8)
+# The resolution tesseract is given for images without one. SetImage passes PIL images to tesseract as BMP images,
+# which PIL saves at 96 DPI unless the image says otherwise, so images passed as raw bytes are given the same one.
+DEFAULT_SOURCE_DPI = 96
+# The names of the OpenMP runtimes tesseract can be built with (GNU, LLVM, and Intel)
+OPENMP_LIBRARIES = ('gomp', 'omp', 'iomp5')
+# The number of PDF pages rasterized at a time, so long PDFs do not have to be held in memory all at once
+PDF_PAGE_BATCH = 2 * PDF_THREAD_COUNT
 
 
 class TextExtractor:
@@ -24,7 +70,11 @@ class TextExtractor:
             seg_func=None, 
             seg_func_args={}, 
             clean_image_func=None,
-            clean_image_func_args={}
+            clean_image_func_args={},
+            blank_mean_threshold=None,
+            blank_std_threshold=None,
+            clean_ahead=True,
+            cache_dir=None
         ):
         """
         Parameters
@@ -49,6 +99,28 @@ class TextExtractor:
             The default is an empty dict.
             If your cleaning function requires arguments, then you must provide them in a dict in the form of 
             {arg1: value1, arg2: value2, ...}
+        blank_mean_threshold : float, optional
+            Segments whose mean pixel value is above this threshold are treated as blank, and are skipped instead of
+            being passed to tesseract. The default is None, which never skips a segment based on its mean.
+        blank_std_threshold : float, optional
+            Segments whose pixel values have a standard deviation below this threshold are treated as blank, and are
+            skipped instead of being passed to tesseract. The default is None, which never skips a segment based on its
+            standard deviation.
+            Values around 250 for blank_mean_threshold and 3 for blank_std_threshold work well for small segments,
+            such as the fields of a form. Avoid them when whole pages are extracted, since a sparse page of text can be
+            almost entirely white.
+        clean_ahead : bool, optional
+            Whether to clean and segment the next page of a file in a background thread while tesseract extracts the
+            text from the current one. The default is True. Set this to False if clean_image_func or seg_func use the
+            tesserocr API attached to this object, since the API can only be used by one thread at a time.
+        cache_dir : str, optional
+            The directory to save the extracted text and word data of every page to, under a hash of the cleaned page.
+            Extracting the text from a page that was already extracted with the same language, page segmentation mode
+            and blank thresholds will load the saved result instead of running tesseract again, which saves time on
+            files with duplicate pages. The default is None, which does not save or load anything. Other variables set
+            on the API (such as tessedit_char_blacklist) are not part of the hash, so use a different cache_dir when
+            changing them. Every result is saved in one step, so the same cache_dir can be shared by several threads
+            and worker processes.
         """
 
         self.api = api
@@ -56,22 +128,28 @@ class TextExtractor:
         self.seg_func_args = seg_func_args
         self.clean_image_func = clean_image_func
         self.clean_image_func_args = clean_image_func_args
-        self.img_file_type  = ['.png', '.jpg', '.jpeg', '.jpe', '.webp', '.bmp', '.webp', '.dib', '.pxm','.pgm',
-                               '.pbm', '.pnm']
+        self.blank_mean_threshold = blank_mean_threshold
+        self.blank_std_threshold = blank_std_threshold
+        self.clean_ahead = clean_ahead
+        self.cache_dir = cache_dir
+        # Kept a list, as it always has been, so callers can still append their own image extensions to it
+        self.img_file_type = sorted(IMAGE_EXTS)
+        # The loaders of the file types that are not read as a single image, by file extension
+        self._file_loaders = {'.pdf': self._load_pdf, **dict.fromkeys(TIFF_EXTS, self._load_tiff)}
         
         # Check if a proper API object was provided
         if not isinstance(api, tesserocr.PyTessBaseAPI):
             raise ValueError("API must be a tesserocr.PyTessBaseAPI object.")
 
         if clean_image_func is None:
-            print("No image cleaning function provided.\n")
-            self.clean_image_func = lambda image: image
+            logger.info("No image cleaning function provided.")
+            self.clean_image_func = _no_cleaning
             self.clean_image_func_args = {}
 
         if seg_func is None:
             # If no segment function is provided, default to no segmentation
-            print("No segment function provided. Defaulting to no segmentation.\n")
-            self.seg_func = lambda image: [image]
+            logger.info("No segment function provided. Defaulting to no segmentation.")
+            self.seg_func = _no_segmentation
             self.seg_func_args = {}
 
     def convert_file_to_images(self, file_name, use_PIL_data_type=False):
@@ -102,52 +180,104 @@ class TextExtractor:
         NOTE: The numpy images will be using RGB color space, which is not what cv2 uses by default (BGR). If you don't
         properly use color space flags when using cv2 functions, you will likely have issues.
         """
-        if file_name.endswith('.pdf'):
-            # Create PIL image List from path/to/pdf. Will grab each page and convert it to be an image in the
-            # returned list. Will return a list regardless of the number of pages.
-            images = convert_from_path(file_name, 300)
-            # Convert the images from PIL to OpenCV for the cleaning function
-            if not use_PIL_data_type:
-                images = [np.array(image.convert('L')) for image in images]
-                    
-        # Check if the file is an image
-        elif file_name.lower().endswith(tuple(self.img_file_type)):
-            if use_PIL_data_type:
-                # Read the image using PIL
-                image = Image.open(file_name).convert('L')
-                images = [image]
-            else:
-                # Read the image using OpenCV
-                image = cv2.imread(file_name, cv2.IMREAD_GRAYSCALE)
-                # This function expects a list of images, so need to convert the image to a list of itself.
-                images = [image]
-        
-        # Handle TIFF files, which may have multiple frames
-        elif file_name.lower().endswith('.tif') or file_name.lower().endswith('.tiff'):
-            # Read the image using PIL
-            image = Image.open(file_name)
-            images = []
-            # Loop through each frame in the TIFF file and convert it to a numpy array
-            for i in range(image.n_frames):
-                image.seek(i)
-                if use_PIL_data_type:
-                    images.append(image.convert('L'))
-                else:
-                    images.append(np.array(image.convert('L')))
+        images = list(self.iter_file_images(file_name, use_PIL_data_type))
+        # Unsupported files do not produce any images
+        return images if images else None
+
+
+    def iter_file_images(self, file_name, use_PIL_data_type=False):
+        """
+        Parameters
+        ----------
+        file_name : str
+            The path to the image or PDF file to extract text from.
+        use_PIL_data_type : bool, optional
+            Whether to yield the images in PIL.Image data type. The default is False, which uses the numpy.ndarray
+            data type.
+
+        Yields
+        ------
+        image : numpy.ndarray OR PIL.Image
+            The grayscaled images contained in the file, one page or frame at a time. Unless use_PIL_data_type is set,
+            these are always 2D uint8 numpy arrays, which are handed to tesseract without going through PIL.
+
+        Description
+        -----------
+        This is the generator version of convert_file_to_images. Image files yield a single image, PDF files yield
+        one image per page, and TIFF files yield one image per frame. TIFF frames are decoded one at a time as they
+        are requested, so only the current frame needs to be held in memory, and frames that are already grayscaled
+        are not converted again. PDF pages are rasterized PDF_PAGE_BATCH pages at a time, so long PDFs never have
+        every page in memory at once. Nothing is yielded for files that are not PDF or image files.
+        """
+        ext = os.path.splitext(file_name)[1].lower()
+        # PDF and TIFF files have their own loaders, and every extension in img_file_type is read as a single image
+        loader = self._file_loaders.get(ext)
+        if loader is None and ext in self.img_file_type:
+            loader = self._load_image
+        if loader is None:
+            logger.warning(f"File {file_name} is not a PDF or image file.")
+            return
+        yield from loader(file_name, use_PIL_data_type)
+
+
+    def _load_pdf(self, file_name, use_PIL_data_type):
+        """Yields the grayscaled pages of a PDF file, for iter_file_images."""
+        # Rasterize the pages of the PDF in batches of PIL images, so only one batch is held in memory at a time.
+        # The pages are rasterized straight to grayscale, and split between multiple poppler processes.
+        page_count = pdfinfo_from_path(file_name)['Pages']
+        for first_page in range(1, page_count + 1, PDF_PAGE_BATCH):
+            last_page = min(first_page + PDF_PAGE_BATCH - 1, page_count)
+            images = convert_from_path(file_name, 300, grayscale=True, thread_count=PDF_THREAD_COUNT,
+                                       first_page=first_page, last_page=last_page)
+            for image in images:
+                # Convert the images from PIL to OpenCV for the cleaning function. They are already grayscaled, so this
+                # is a single copy of the pixels, without a conversion. np.array keeps the copy writable, unlike
+                # np.asarray, so cleaning functions can still modify the pages in place.
+                yield image if use_PIL_data_type else np.array(image)
 
+
+    def _load_image(self, file_name, use_PIL_data_type):
+        """Yields a single image file as a grayscaled image, for iter_file_images."""
+        if use_PIL_data_type:
+            # Read the image using PIL
+            yield Image.open(file_name).convert('L')
         else:
-            print(f"File {file_name} is not a PDF or image file.")
-            return None
-        
-        return images
+            # Read the file's bytes with numpy and decode them with OpenCV, which reads the file in one call and, unlike
+            # imread, also works with non-ASCII paths on Windows. imdecode returns None instead of raising for data
+            # it cannot decode, so only yield real arrays and let the caller report that nothing could be extracted.
+            try:
+                image = cv2.imdecode(np.fromfile(file_name, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            except OSError:
+                image = None
+            if image is not None:
+                yield image
+            else:
+                logger.warning(f"Could not read the image {file_name}.")
+
+
+    def _load_tiff(self, file_name, use_PIL_data_type):
+        """Yields every frame of a TIFF file, which may have multiple frames, as a grayscaled image, for
+        iter_file_images."""
+        # Read the image using PIL
+        image = Image.open(file_name)
+        # Loop through each frame in the TIFF file, only decoding the frame that is being yielded
+        for frame in ImageSequence.Iterator(image):
+            if frame.mode == 'L':
+                # The PIL frame must be copied, since moving to the next frame changes the image object
+                frame = frame.copy() if use_PIL_data_type else frame
+            else:
+                frame = frame.convert('L')
+            # np.array copies the frame into a writable array, so cleaning functions can modify it in place
+            yield frame if use_PIL_data_type else np.array(frame)
 
 
     def get_text(self, image, psm=PSM.AUTO):
         """
         Parameters
         ----------
-        image : PIL.Image
-            The image to extract text from. Must be a PIL.Image object.
+        image : numpy.ndarray OR PIL.Image
+            The image to extract text from. It is passed to clean_image_func and seg_func first, so it must be a type
+            they accept. Segments that are grayscaled uint8 numpy arrays are handed to tesseract without a PIL copy.
 
         Returns
         -------
@@ -159,47 +289,216 @@ class TextExtractor:
         This function extracts the text from an image using the tesserocr library. The text is returned as a string.
         """
         self.api.SetPageSegMode(psm)
-        
+        return self._get_text(image)
+
+
+    def _get_text(self, image):
+        """Extracts the text from an image like get_text, but with the page segmentation mode the API is already set
+        to. Used when extracting a whole file, so the mode is only set once instead of once per page."""
+        return self._recognize_text(self._prepare_segments(image))
+
+
+    def _prepare_segments(self, image):
+        """Cleans an image with clean_image_func and splits it into segments with seg_func. Returns the list of
+        segments to extract the text from. This does not use the tesserocr API, so it can run in another thread."""
         clean_image = self.clean_image_func(image, **self.clean_image_func_args)
+        return list(self.seg_func(clean_image, **self.seg_func_args))
+
+
+    def _iter_prepared_segments(self, images):
+        """Yields the segments of each image in images, in order. If clean_ahead is set, the next image is cleaned and
+        segmented in a background thread while the segments of the current image are being used by the caller."""
+        if not self.clean_ahead:
+            for image in images:
+                yield self._prepare_segments(image)
+            return
+
+        images = iter(images)
+        # A single thread reads, cleans and segments the images one at a time and in order, only overlapping with
+        # tesseract. Reading the next image happens in that thread too, since decoding a PDF page or TIFF frame can cost
+        # as much as cleaning it
+        with ThreadPoolExecutor(max_workers=1) as cleaner:
+            future = cleaner.submit(self._read_and_prepare, images)
+            while True:
+                segments = future.result()
+                if segments is None:
+                    return
+                future = cleaner.submit(self._read_and_prepare, images)
+                yield segments
+
+
+    def _read_and_prepare(self, images):
+        """Takes the next image out of the iterator images and returns its cleaned segments, or None if there are no
+        images left."""
+        image = next(images, None)
+        return self._prepare_segments(image) if image is not None else None
 
-        segments = self.seg_func(clean_image, **self.seg_func_args)
 
-        text = ''
+    def _recognize_text(self, segments):
+        """Extracts the text from segments that were already cleaned and segmented, and joins it together."""
+        cache_path = self._cache_path(segments, 'txt')
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8', newline='') as f:
+                return f.read()
+
+        # Collect the text of each segment and join it once at the end, instead of growing a string per segment
+        texts = []
         for segment in segments:
-            image = Image.fromarray(segment) if not isinstance(segment, Image.Image) else segment
-            self.api.SetImage(image)
-            text += self.api.GetUTF8Text()
+            # Don't waste a tesseract call on a segment without any text in it
+            if self._is_blank(segment):
+                continue
+            self._set_image(segment)
+            texts.append(self.api.GetUTF8Text())
+        text = ''.join(texts)
 
+        if cache_path is not None:
+            self._save_to_cache(cache_path, lambda f: f.write(text))
         return text
 
 
+    def _cache_path(self, segments, ext):
+        """Returns the path in cache_dir to save the result of extracting the text from segments to, named after a
+        hash of the segments and of the settings that change the result. Returns None if cache_dir is not set."""
+        if self.cache_dir is None:
+            return None
+
+        key = hashlib.blake2b(digest_size=16)
+        settings = (ext, int(self.api.GetPageSegMode()), self.api.GetInitLanguagesAsString(),
+                    self.blank_mean_threshold, self.blank_std_threshold)
+        key.update(repr(settings).encode())
+        for segment in segments:
+            segment = np.ascontiguousarray(segment)
+            key.update(repr((segment.shape, segment.dtype.str)).encode())
+            key.update(segment.data)
+        return os.path.join(self.cache_dir, key.hexdigest() + '.' + ext)
+
+
+    def _save_to_cache(self, cache_path, write):
+        """Saves a result to cache_path, by calling write with a temporary file in cache_dir and then moving that file
+        into place in one step. Other threads and processes sharing the cache_dir then either find the whole result at
+        cache_path or nothing at all, never a partly written file."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8', newline='') as f:
+                write(f)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+    def get_texts_batch(self, images, psm=PSM.SINGLE_BLOCK):
+        """
+        Parameters
+        ----------
+        images : list<numpy.ndarray OR PIL.Image>
+            The images to extract text from. These should already be cleaned, since the clean_image_func and seg_func
+            functions will not be applied to them.
+        psm : tesserocr.PSM, optional
+            The page segmentation mode to use for every image. The default is PSM.SINGLE_BLOCK, since the images are
+            expected to be small cropped segments of a larger image.
+
+        Returns
+        -------
+        texts : list<str>
+            The extracted text for each image, in the same order as the images were provided.
+
+        Description
+        -----------
+        This function extracts the text from a batch of already preprocessed images, such as the segments returned by
+        ImageCropper. The page segmentation mode is only set once for the whole batch, and each image is passed
+        directly to the already configured API, so the per-image cost is just the recognition itself.
+        """
+        self.api.SetPageSegMode(psm)
+
+        texts = []
+        for image in images:
+            self._set_image(image)
+            texts.append(self.api.GetUTF8Text())
+
+        return texts
+
+
+    def _is_blank(self, image):
+        """Checks whether an image is blank according to the blank_mean_threshold and blank_std_threshold values, using
+        only cheap numpy reductions over the pixels."""
+        if self.blank_mean_threshold is None and self.blank_std_threshold is None:
+            return False
+
+        pixels = np.asarray(image)
+        if pixels.size == 0:
+            return True
+        if self.blank_mean_threshold is not None and pixels.mean() > self.blank_mean_threshold:
+            return True
+        if self.blank_std_threshold is not None and pixels.std() < self.blank_std_threshold:
+            return True
+        return False
+
+
+    def _set_image(self, image):
+        """Passes an image to the API. Grayscaled uint8 numpy arrays and grayscaled PIL images are handed to tesseract
+        as raw bytes, which skips encoding them for tesseract. Any other image goes through PIL."""
+        if isinstance(image, np.ndarray) and image.ndim == 2 and image.dtype == np.uint8:
+            height, width = image.shape
+            # tobytes() packs the rows, so each line is exactly one byte per pixel wide, even for cropped views
+            data, dpi = image.tobytes(), DEFAULT_SOURCE_DPI
+        elif isinstance(image, Image.Image) and image.mode == 'L':
+            width, height = image.size
+            # Keep the resolution of the PIL image if it has one, the same as SetImage would
+            data, dpi = image.tobytes(), image.info.get('dpi', (DEFAULT_SOURCE_DPI,))[0]
+        else:
+            image = Image.fromarray(image) if not isinstance(image, Image.Image) else image
+            self.api.SetImage(image)
+            return
+
+        self.api.SetImageBytes(data, width, height, 1, width)
+        # Raw bytes carry no resolution, so give tesseract the one it would have been given through SetImage instead
+        # of leaving it to guess
+        self.api.SetSourceResolution(int(round(dpi)))
+
+
     def get_coordinate_data(self, image, psm=PSM.AUTO):
         """
         Parameters
         ----------
-        image : PIL.Image
-            The image to extract text and coordinate data from. Must be a PIL.Image object.
+        image : numpy.ndarray OR PIL.Image
+            The image to extract text and coordinate data from. It is passed to clean_image_func and seg_func first, so
+            it must be a type they accept. Segments that are grayscaled uint8 numpy arrays are handed to tesseract
+            without a PIL copy.
 
         Returns
         -------
-        data : list<dict>
-            A list of dictionaries for each word. Each dictionary contains the extracted text, confidence, and coordinate data. The keys are 'left', 'top', 
-            'right', 'bottom', 'conf', and 'text'.
+        data : list<Word>
+            A list of Word named tuples, one for each word. Each one contains the extracted text, confidence, and
+            coordinate data of the word, in the fields 'left', 'top', 'right', 'bottom', 'conf', and 'text'.
 
         Description
         -----------
-        This function extracts the text, confidence, and coordinate data of every word in an image. The data is stored in a
-        dictionary to easily access the data.
+        This function extracts the text, confidence, and coordinate data of every word in an image. The data of each
+        word is stored in a named tuple, so it can be read by field name (word.text) as well as by position.
         """
         self.api.SetPageSegMode(psm)
-        
-        clean_image = self.clean_image_func(image, **self.clean_image_func_args)
-        segments = self.seg_func(clean_image, **self.seg_func_args)
+        return self._get_coordinate_data(image)
+
+
+    def _get_coordinate_data(self, image):
+        """Extracts the word data from an image like get_coordinate_data, but with the page segmentation mode the API
+        is already set to."""
+        return self._recognize_coordinate_data(self._prepare_segments(image))
+
+
+    def _recognize_coordinate_data(self, segments):
+        """Extracts the word data from segments that were already cleaned and segmented."""
+        cache_path = self._cache_path(segments, 'json')
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8') as f:
+                return [Word(*row) for row in json.load(f)]
+
         data = []
 
         for segment in segments:
-            image = Image.fromarray(segment)
-            self.api.SetImage(image)
+            self._set_image(segment)
             self.api.Recognize()
 
             iterator = self.api.GetIterator()
@@ -211,15 +510,13 @@ class TextExtractor:
                 # Skip over words that don't have a bounding box
                 if bbox is None:
                     continue
-                
-                data.append({
-                    'left': bbox[0],
-                    'top': bbox[1],
-                    'right': bbox[2],
-                    'bottom': bbox[3],
-                    'conf': round(i.Confidence(tesserocr.RIL.WORD), 2), # Round to 2 decimal places
-                    'text': i.GetUTF8Text(tesserocr.RIL.WORD)
-                })
+
+                left, top, right, bottom = bbox
+                conf = round(i.Confidence(tesserocr.RIL.WORD), 2) # Round to 2 decimal places
+                data.append(Word(left, top, right, bottom, conf, i.GetUTF8Text(tesserocr.RIL.WORD)))
+
+        if cache_path is not None:
+            self._save_to_cache(cache_path, lambda f: json.dump(data, f))
         return data
 
 
@@ -227,9 +524,10 @@ class TextExtractor:
         """
         Parameters
         ----------
-        data : list<dict>
-            A list of dictionaries for each word. Each dictionary contains the extracted word, confidence, and
-            coordinate data for that word. The keys are 'left', 'top', 'right', 'bottom', 'conf', and 'text'.
+        data : list<Word>
+            A list of Word named tuples for each word, as returned by get_coordinate_data. Each one contains the
+            extracted word, confidence, and coordinate data for that word. Dictionaries with the keys 'left', 'top',
+            'right', 'bottom', 'conf', and 'text' (in that order) are also accepted.
         
         Returns
         -------
@@ -244,10 +542,8 @@ class TextExtractor:
 
         This will be useful to for printing the data or saving the data to a text file.
         """
-        text = ''
-        for word in data:
-            text += '\t'.join(str(value) for value in word.values()) + '\n'
-        return text
+        # Build every row first and join them once, instead of growing the string one word at a time
+        return ''.join(list(_iter_coord_rows(data)))
 
 
     def extract_from_file(self, file_path, output_path=None, print_results=False, get_data=False, psm=PSM.AUTO):
@@ -266,10 +562,10 @@ class TextExtractor:
 
         Returns
         -------
-        data or text : list<dict> or str
+        data or text : list<Word> or str
             -- If get_data is True, then the extracted word-specific data will be returned. This data includes the text,
-            confidence, and coordinate data of each word in the image. This data will be returned as a list of dictionaries.
-            each dictionary will contain the information for each word, which includes the keys 'left', 'top', 'right',
+            confidence, and coordinate data of each word in the image. This data will be returned as a list of Word
+            named tuples. Each one will contain the information for each word, in the fields 'left', 'top', 'right',
             'bottom', 'conf', and 'text'.
             -- If get_data is False, then the extracted text will be returned as a string. There will not be any other data
             returned other than the extracted text.
@@ -288,22 +584,122 @@ class TextExtractor:
         outputted (Effectively using system resources to do nothing). This function does not return any data, so it
         cannot be used to store the extracted text in a variable.
         """
-        images = self.convert_file_to_images(file_path)
-        if images is None:
-            print(f"Could not extract text from {file_path}.")
+        # Read the pages one at a time, only looking ahead far enough to know if the file has more than one page
+        images = self.iter_file_images(file_path)
+        first_images = list(islice(images, 2))
+        if not first_images:
+            logger.warning(f"Could not extract text from {file_path}.")
             return None
-        
-        for i, image in enumerate(images):
-            # Extract text or data from the image
+        multiple_pages = len(first_images) > 1
+        images = chain(first_images, images)
+
+        # Set the page segmentation mode once for the whole file instead of once per page
+        self.api.SetPageSegMode(psm)
+        if get_data:
+            results = (self._recognize_coordinate_data(segments) for segments in self._iter_prepared_segments(images))
+        else:
+            results = (self._recognize_text(segments) for segments in self._iter_prepared_segments(images))
+        return self._output_file_results(results, multiple_pages, output_path, print_results, get_data)
+
+
+    def extract_from_file_concurrent(self, file_path, output_path=None, print_results=False, get_data=False,
+                                     psm=PSM.AUTO, workers=None, api_variables=None):
+        """
+        Parameters
+        ----------
+        file_path : str
+            The path to the image or PDF file to extract text from.
+        output_path : str, optional
+            The path to save the extracted text to. The default is None (no text file will be saved).
+        print_results : bool, optional
+            Whether to print the extracted text to the console. The default is False.
+        get_data : bool, optional
+            Whether to extract word-specific data from the images. The default is False.
+        psm : tesserocr.PSM, optional
+            The page segmentation mode to use for every page. The default is PSM.AUTO.
+        workers : int, optional
+            The number of threads to extract the text from the pages with. The default is None, which uses one thread
+            per CPU. No more threads are used than there are pages.
+        api_variables : dict, optional
+            The tesseract variables to set on the API of each thread with SetVariable, in the form of
+            {name: value, ...}. The default is None, which does not set any variables.
+
+        Returns
+        -------
+        data or text : list<Word> or str
+            The same as extract_from_file.
+
+        Description
+        -----------
+        This function works the same way as extract_from_file, but extracts the text from the pages of the file at
+        the same time, which is much faster for PDFs with many pages. Each thread opens its own tesserocr API the first
+        time it is given a page, with the same data path, language, and engine mode as this object's API, and closes it
+        once every page has been extracted. The variables that were set on this object's API must also be passed in
+        api_variables to be applied to those APIs. Tesseract releases the GIL while it works, so the pages are
+        extracted in parallel without starting new processes. The clean_image_func and seg_func functions are called
+        from several threads at once, so they must not keep any state between calls.
+
+        The pages are read one at a time as the threads need them, and only about two pages per thread are waiting to
+        be extracted at any time, so long PDFs are never held in memory all at once.
+        """
+        # Read the pages one at a time, only looking ahead far enough to know if the file has more than one page
+        images = self.iter_file_images(file_path)
+        first_images = list(islice(images, 2))
+        if not first_images:
+            logger.warning(f"Could not extract text from {file_path}.")
+            return None
+        multiple_pages = len(first_images) > 1
+        images = chain(first_images, images)
+
+        api_kwargs = self._api_kwargs()
+        # The pages are already spread over the threads, so the threads do not also clean the next page ahead
+        extractor_kwargs = dict(self._extractor_kwargs(), clean_ahead=False)
+        local = threading.local()
+        apis = []
+        apis_lock = threading.Lock()
+
+        def extract_page(image):
+            # Open an API for this thread the first time it is given a page, in the thread that will use it
+            extractor = getattr(local, 'extractor', None)
+            if extractor is None:
+                api = tesserocr.PyTessBaseAPI(**api_kwargs)
+                with apis_lock:
+                    apis.append(api)
+                for name, value in (api_variables or {}).items():
+                    api.SetVariable(name, value)
+                api.SetPageSegMode(psm)
+                extractor = local.extractor = TextExtractor(api, **extractor_kwargs)
+            return extractor._get_coordinate_data(image) if get_data else extractor._get_text(image)
+
+        workers = workers or os.cpu_count() or 1
+        try:
+            # The threads are only started as pages are submitted, so a file with few pages does not start them all
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = _map_ahead(executor, extract_page, images, 2 * workers)
+                return self._output_file_results(results, multiple_pages, output_path, print_results, get_data)
+        finally:
+            for api in apis:
+                api.End()
+
+
+    def _output_file_results(self, results, multiple_pages, output_path, print_results, get_data):
+        """Prints and saves the text or word data of each page of a file, as extract_from_file describes. Returns the
+        result of the last page."""
+        if output_path:
+            # Create the output directory once for every page, instead of once per page
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            name, ext = os.path.splitext(output_path)
+
+        for i, result in enumerate(results):
             if get_data:
-                # Extract the text and coordinate data from the image
-                data = self.get_coordinate_data(image, psm)
-                if output_path or print_results:
+                data = result
+                if print_results:
                     # Convert the returned data to text, and add a header to the text
-                    text = 'left\ttop\tright\tbottom\tconf\ttext\n' + self.convert_coord_data_to_text(data)
+                    text = COORD_DATA_HEADER + self.convert_coord_data_to_text(data)
             else:
-                # Just extract the text from the image
-                text = self.get_text(image, psm)
+                text = result
 
             # Print extracted information to console if print_results is True
             if print_results:
@@ -311,21 +707,30 @@ class TextExtractor:
 
             # Save the extracted text to text file if output_path is provided
             if output_path:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 # If there are multiple images, add a number to the output name
-                if len(images) > 1:
-                    name, ext = os.path.splitext(output_path)
+                if multiple_pages:
                     new_output_path = name + f'_{i}' + ext
                 else:
                     new_output_path = output_path
-                with open(new_output_path, 'w') as f:
-                    f.write(text)
+                with open(new_output_path, 'w', buffering=1 << 20) as f:
+                    if get_data and not print_results:
+                        # Write the rows of the word data as they are formatted, instead of building the whole text
+                        f.write(COORD_DATA_HEADER)
+                        self._write_coord_rows(f, data)
+                    else:
+                        f.write(text)
 
         return data if get_data else text
 
+
+    def _write_coord_rows(self, f, data):
+        """Writes the rows of convert_coord_data_to_text for the word data to the opened file f, one row at a time."""
+        f.writelines(_iter_coord_rows(data))
+
     
 
-    def extract_from_list(self, input_list, output_dir=None, print_results=False, get_data=False, psm=PSM.AUTO):
+    def extract_from_list(self, input_list, output_dir=None, print_results=False, get_data=False, psm=PSM.AUTO,
+                          workers=1, api_variables=None, force=False):
         """
         Parameters
         ----------
@@ -338,6 +743,15 @@ class TextExtractor:
         get_data : bool, optional
             Whether to extract word-specific data from the images. The default is False.
             Word-specific data includes the text, confidence, and coordinate data of each word in the image.
+        workers : int, optional
+            The number of processes to extract the text with. The default is 1, which extracts the text from the files
+            one at a time using the API attached to this object. Use None for one process per CPU.
+        api_variables : dict, optional
+            The tesseract variables to set on the API of each worker process with SetVariable, in the form of
+            {name: value, ...}. The default is None, which does not set any variables. Only used when workers is not 1.
+        force : bool, optional
+            Whether to extract the text from every file, even from files whose extracted text has already been saved
+            to output_dir. The default is False, which skips those files.
 
         Returns
         -------
@@ -347,7 +761,7 @@ class TextExtractor:
         -----------
         This function extracts text from a list of image or PDF file paths. The text is extracted using the tesseract
         API through the tesserocr library. The extracted text can either be printed to the console or saved to a text
-        file in the output_dir directory. This function will also print the time taken to extract the from every file.
+        file in the output_dir directory. This function will also log the time taken to extract the from every file.
         
         If get_data is True, then word-specific data will be extracted from the images. This data includes the text,
         confidence, and coordinate data of each word in the image. This is what is printed to the console or saved to
@@ -362,52 +776,332 @@ class TextExtractor:
         This function will use the seg_func and clean_image_func functions provided to the TextExtractor class to 
         segment and clean the images before using tesseract to extract the text. The changing of these functions must
         be done using the TextExtractor class object, not this function.
+
+        If workers is not 1, the files are split between a pool of worker processes. Each worker opens its own
+        tesserocr API with the same data path, language, and engine mode as this object's API, and builds its own
+        TextExtractor with the same segmentation and cleaning functions, so every file is still processed exactly the
+        same way.
+        Variables that were set on this object's API cannot be read back from tesseract, so they must also be passed
+        in api_variables to be applied in the workers. Each worker tells the OpenMP runtime loaded with tesseract to
+        use a single thread, so the workers do not compete for the CPUs with several threads each. The results are
+        printed and saved by the calling process, in the same order as input_list. On systems that start processes with 'spawn' (Windows, macOS), the
+        seg_func and clean_image_func functions must be picklable, which means they cannot be lambdas or locally
+        defined functions.
+
+        When output_dir is set and force is False, files whose text file in output_dir was saved after the file was
+        last modified are skipped, so running this function again on a growing list of files only extracts the text
+        from the new or changed files. For files with multiple pages, the text file of the last page is checked, since
+        it is saved last, so files that were only partly extracted by an interrupted run are extracted again. Files
+        that were saved with a different get_data setting are extracted again as well. Other settings are not
+        recorded, so set force to True after changing psm, the cleaning or segmentation functions, or the API's
+        variables.
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
 
-        
+        if output_dir and not force:
+            # Skip the files that have already been extracted since they were last changed
+            remaining_files = []
+            for file_name in input_list:
+                if self._is_output_up_to_date(file_name, output_dir, get_data):
+                    logger.info(f"Skipping {file_name}, its extracted text is up to date.")
+                else:
+                    remaining_files.append(file_name)
+            input_list = remaining_files
+
+        # Save the text files from a separate thread, so writing one file overlaps with extracting the next one
+        if output_dir:
+            # Every text file is saved directly in output_dir, so it only has to be created once
+            os.makedirs(output_dir, exist_ok=True)
+            write_queue = queue.Queue(maxsize=64)
+            write_errors = []
+            writer = threading.Thread(target=write_queued_items, args=(write_queue, _write_file, write_errors),
+                                      daemon=True)
+            writer.start()
+
+        try:
+            for file_name, texts in self._iter_extracted_files(input_list, get_data, psm, workers, api_variables):
+                if texts is None:
+                    logger.warning(f"Could not extract text from {file_name}.")
+                    continue
+
+                base_name = os.path.basename(file_name)
+                # Loop through the text of each image (could be multiple pages if PDF)
+                for i, text in enumerate(texts):
+                    # Print extracted information to console if print_results is True
+                    if print_results:
+                        print("\n"+"#"*50)
+                        print(f"Extracted text from {file_name}")
+                        print("#"*50)
+                        print(text)
+                        print("#"*50)
+                        print("End of extracted text.")
+                        print("#"*50+"\n")
+
+                    # Save the extracted text to text file if output_dir is provided
+                    if output_dir:
+                        if len(texts) > 1:
+                            save_path = os.path.join(output_dir, f'{base_name}_{i}.txt')
+                        else:
+                            save_path = os.path.join(output_dir, f'{base_name}.txt')
+
+                        write_queue.put((save_path, text.encode('utf-8')))
+        finally:
+            if output_dir:
+                # Wait for every queued file to be written
+                write_queue.put(None)
+                writer.join()
+
+        if output_dir and write_errors:
+            raise write_errors[0]
+
+        logger.info(f"Time taken: {time.perf_counter() - start_time:.2f} seconds")
+
+
+    def _is_output_up_to_date(self, file_name, output_dir, get_data):
+        """Checks whether the text extracted from a file has been saved in output_dir by extract_from_list since the
+        file was last modified, with the same get_data setting. Files with multiple pages are checked using the text
+        file of their last page, which is the last one saved."""
+        base_name = os.path.basename(file_name)
+        try:
+            input_mtime = os.stat(file_name).st_mtime
+        except FileNotFoundError:
+            return False
+
+        page_count = self._count_pages(file_name)
+        if page_count is None:
+            return False
+        save_name = f'{base_name}.txt' if page_count == 1 else f'{base_name}_{page_count - 1}.txt'
+
+        header = COORD_DATA_HEADER.encode('utf-8')
+        try:
+            save_path = os.path.join(output_dir, save_name)
+            if os.stat(save_path).st_mtime < input_mtime:
+                return False
+            # Word data always starts with its header row, which tells it apart from text saved without get_data
+            with open(save_path, 'rb') as f:
+                return (f.read(len(header)) == header) == get_data
+        except FileNotFoundError:
+            return False
+
+
+    def _count_pages(self, file_name):
+        """Returns the number of images iter_file_images yields for a file, reading only the file's metadata, or None
+        if the file cannot be read."""
+        ext = os.path.splitext(file_name)[1].lower()
+        try:
+            if ext == '.pdf':
+                return pdfinfo_from_path(file_name)['Pages']
+            if ext in TIFF_EXTS:
+                with Image.open(file_name) as image:
+                    return getattr(image, 'n_frames', 1)
+        except Exception:
+            # Let the extraction report the error
+            return None
+        return 1
+
+
+    def _iter_extracted_files(self, input_list, get_data, psm, workers, api_variables):
+        """Yields a (file_name, texts) tuple for every file in input_list, in order, where texts is the list of the
+        extracted text of each image in the file, or None if the file could not be converted to images. The files are
+        split between a pool of worker processes when workers is not 1."""
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers <= 1 or len(input_list) < 2:
+            for file_name, images in self._iter_file_images_ahead(input_list):
+                yield file_name, self._extract_images_texts(images, get_data, psm)
+            return
+
+        api_kwargs = self._api_kwargs()
+        extractor_kwargs = self._extractor_kwargs()
+        workers = min(workers, len(input_list))
+        # Send the files to the workers in chunks to cut down on the messages between processes, while keeping the
+        # chunks small enough (about 4 per worker) that a few large files do not leave the other workers idle
+        chunksize = max(1, len(input_list) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(api_kwargs, api_variables or {}, extractor_kwargs)) as executor:
+            results = executor.map(_extract_file_texts_in_worker, input_list, repeat(get_data), repeat(psm),
+                                   chunksize=chunksize)
+            yield from zip(input_list, results)
+
+
+    def _api_kwargs(self):
+        """Returns the arguments to open another tesserocr API with the same data path, language, and engine mode as
+        this object's."""
+        return {'path': self.api.GetDatapath(), 'lang': self.api.GetInitLanguagesAsString(), 'oem': self.api.oem()}
+
+
+    def _extractor_kwargs(self):
+        """Returns the arguments to build another TextExtractor that processes images the same way as this one."""
+        return {
+            'seg_func': self.seg_func,
+            'seg_func_args': self.seg_func_args,
+            'clean_image_func': self.clean_image_func,
+            'clean_image_func_args': self.clean_image_func_args,
+            'blank_mean_threshold': self.blank_mean_threshold,
+            'blank_std_threshold': self.blank_std_threshold,
+            'clean_ahead': self.clean_ahead,
+            'cache_dir': self.cache_dir
+        }
+
+
+    def _iter_file_images_ahead(self, input_list):
+        """Yields a (file_name, images) tuple for every file in input_list, in order, where images iterates over the
+        images of the file. A background thread reads the images of the files ahead of the caller, a couple of images
+        at a time, so reading the next file overlaps with extracting the text from the current one."""
+        image_queue = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        reader = threading.Thread(target=_read_file_images, args=(self, input_list, image_queue, stop), daemon=True)
+        reader.start()
+        try:
+            for file_name in input_list:
+                images = _iter_queued_images(image_queue)
+                yield file_name, images
+                # Skip over any images of this file the caller did not use, to get to the next file's images
+                for _ in images:
+                    pass
+        finally:
+            stop.set()
+            reader.join()
+
+
+    def _extract_file_texts(self, file_name, get_data, psm):
+        """Extracts the text, or the word data converted to text, from every image in a file. Returns a list with the
+        text of each image, or None if the file could not be converted to images."""
+        # Read the images of the file one at a time (could be multiple pages if PDF), so only the page being
+        # extracted, and the one being cleaned ahead of it, are held in memory
+        return self._extract_images_texts(self.iter_file_images(file_name), get_data, psm)
+
+
+    def _extract_images_texts(self, images, get_data, psm):
+        """Extracts the text, or the word data converted to text, from the images of a file, as _extract_file_texts
+        describes."""
+        # Set the page segmentation mode once for the whole file instead of once per page
+        self.api.SetPageSegMode(psm)
+        texts = []
+        for segments in self._iter_prepared_segments(images):
+            # Extract text or data from the image
+            if get_data:
+                # Extract the text and coordinate data from the image
+                data = self._recognize_coordinate_data(segments)
+                # Convert the returned data to text, and add a header to the text
+                texts.append(COORD_DATA_HEADER + self.convert_coord_data_to_text(data))
+            else:
+                # Just extract the text from the image
+                texts.append(self._recognize_text(segments))
+        return texts if texts else None
+
+
+def _write_file(path, data):
+    """Writes the bytes in data to the file at path. Used by the writer thread of TextExtractor.extract_from_list."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # os.write may write less than all of the data, so keep writing until everything is written
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _read_file_images(extractor, input_list, image_queue, stop):
+    """Reads the images of every file in input_list with the extractor's iter_file_images, and puts them in
+    image_queue. Used as the reader thread of TextExtractor._iter_file_images_ahead. None is put after the last image of
+    each file, and an error raised while reading a file is put in the queue, to be raised by the thread extracting the
+    text. Stops early once stop is set."""
+    try:
         for file_name in input_list:
-            # Convert the file to into a list of images (could be multiple pages if PDF)
-            images = self.convert_file_to_images(file_name)
-            if images is None:
-                print(f"Could not extract text from {file_name}.")
-                continue
+            for image in extractor.iter_file_images(file_name):
+                if not put_until_stopped(image_queue, image, stop):
+                    return
+            if not put_until_stopped(image_queue, None, stop):
+                return
+    except Exception as error:
+        put_until_stopped(image_queue, error, stop)
 
-            # Loop through each image
-            for i, image in enumerate(images):
-                # Extract text or data from the image
-                if get_data:
-                    # Extract the text and coordinate data from the image
-                    data = self.get_coordinate_data(image, psm)
-                    # Convert the returned data to text, and add a header to the text
-                    text = 'left\ttop\tright\tbottom\tconf\ttext\n' + self.convert_coord_data_to_text(data)
-                else:
-                    # Just extract the text from the image
-                    text = self.get_text(image, psm)
 
-                # Print extracted information to console if print_results is True
-                if print_results:
-                    print("\n"+"#"*50)
-                    print(f"Extracted text from {file_name}")
-                    print("#"*50)
-                    print(text)
-                    print("#"*50)
-                    print("End of extracted text.")
-                    print("#"*50+"\n")
-
-                # Save the extracted text to text file if output_dir is provided
-                if output_dir:
-                    file_name = os.path.basename(file_name)
-                    if len(images) > 1:
-                        save_path = os.path.join(output_dir, f'{file_name}_{i}.txt')
-                    else:
-                        save_path = os.path.join(output_dir, f'{file_name}.txt')
+def _iter_queued_images(image_queue):
+    """Yields the images put in image_queue by _read_file_images until the end of the current file."""
+    while True:
+        item = image_queue.get()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
 
-                    os.makedirs(os.path.dirname(save_path), exist_ok=True)   
-                    with open(save_path, 'w') as f:
-                        f.write(text)
 
-        print(f"Time taken: {time.time() - start_time:.2f} seconds")
+def _map_ahead(executor, func, items, limit):
+    """Yields func(item) for every item in items, in order, computed by the executor. Only limit items are submitted
+    ahead of the result being yielded, so the rest of the items are not read from items until they are needed."""
+    futures = deque()
+    try:
+        for item in items:
+            futures.append(executor.submit(func, item))
+            if len(futures) >= limit:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        # Don't extract the remaining items if the caller stopped early or an item failed
+        for future in futures:
+            future.cancel()
+
+
+def _iter_coord_rows(data):
+    """Yields the tab separated row of text of each word in the word data, ending in a newline."""
+    for word in data:
+        yield '\t'.join(map(str, word.values() if isinstance(word, dict) else word)) + '\n'
+
+
+def _no_cleaning(image):
+    """Default cleaning function, which returns the image as it is."""
+    return image
+
+
+def _no_segmentation(image):
+    """Default segmentation function, which returns the whole image as the only segment."""
+    return [image]
+
+
+# The TextExtractor of a worker process started by TextExtractor.extract_from_list
+_worker_extractor = None
+
+
+def _init_worker(api_kwargs, api_variables, extractor_kwargs):
+    """Opens a tesserocr API and builds the TextExtractor that a worker process uses for every file it is given. The API
+    stays open for the lifetime of the worker process."""
+    global _worker_extractor
+    # The files are already spread over the worker processes, so OpenCV should not also start a thread per CPU in
+    # every worker while cleaning the images
+    cv2.setNumThreads(1)
+    # Tesseract would also run each page on several OpenMP threads, which oversubscribes the CPUs when every worker
+    # does it
+    _limit_openmp_threads()
+    api = tesserocr.PyTessBaseAPI(**api_kwargs)
+    for name, value in api_variables.items():
+        api.SetVariable(name, value)
+    _worker_extractor = TextExtractor(api, **extractor_kwargs)
+
+
+def _limit_openmp_threads():
+    """Makes the OpenMP runtime that tesseract uses run on a single thread for the calling thread. OMP_THREAD_LIMIT
+    only works if it is set before tesseract is loaded, but omp_set_num_threads works at any time. Opening the runtime
+    by name returns the copy already loaded with tesseract. Does nothing if tesseract was built without OpenMP."""
+    for name in OPENMP_LIBRARIES:
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            ctypes.CDLL(path).omp_set_num_threads(1)
+        except (OSError, AttributeError):
+            continue
+        return
+
+
+def _extract_file_texts_in_worker(file_name, get_data, psm):
+    """Extracts the text from every image in a file using the worker process' TextExtractor."""
+    return _worker_extractor._extract_file_texts(file_name, get_data, psm)
 
 
 if __name__ == "__main__":
@@ -420,8 +1114,15 @@ if __name__ == "__main__":
     parser.add_argument('-o', '--output', help='Path to the directory to save the extracted text files to')
     parser.add_argument('--print', action='store_true', help='If set, will print the extracted text to the console')
     parser.add_argument('--get_data', action='store_true', help='If set, will extract word-specific data from the images')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to extract text from a directory with. Use 0 for one per CPU')
+    parser.add_argument('--force', action='store_true',
+                        help='If set, will extract text from every file in the directory, even if it was already saved')
     args = parser.parse_args()
 
+    # Write the status messages to stderr, so only the extracted text is printed to stdout
+    logging.basicConfig(format='%(message)s', level=logging.INFO, stream=sys.stderr)
+
     # Print if neither print or output is set
     print_text = True if not args.output else args.print
 
@@ -429,21 +1130,21 @@ if __name__ == "__main__":
     from ImageProcessor import ImageProcessor
     clean_image_func = ImageProcessor() # Use the default ImageProcessor class to clean the images
 
+    # Variables to set on the tesseract API, and on the API of every worker process. The pages are cleaned into dark
+    # text on a light background, so tesseract's check for inverted (light on dark) text lines is skipped.
+    api_variables = {"debug_file": "/dev/null", 'tessedit_char_blacklist': '|{}()><\\©', 'tessedit_do_invert': '0'}
 
-    # Define the accepted file types
-    accepted_file_types = ('.png', '.jpg', '.jpeg', '.jpe', '.webp', '.bmp', '.webp', '.dib', '.pxm', '.pgm',
-                            '.pbm', '.pnm', '.pdf')
-
-    # Need to initialize the API to extract text with the TextExtractor class
-    with tesserocr.PyTessBaseAPI() as api:
-        api.SetVariable("debug_file", "/dev/null")
-        api.SetVariable('tessedit_char_blacklist', '|{}()><\\©')
+    # Need to initialize the API to extract text with the TextExtractor class. Only the LSTM engine is used, which skips
+    # loading and running the slower legacy engine when the language data includes it.
+    with tesserocr.PyTessBaseAPI(oem=OEM.LSTM_ONLY) as api:
+        for name, value in api_variables.items():
+            api.SetVariable(name, value)
 
         text_extractor = TextExtractor(api, clean_image_func=clean_image_func)
 
         if args.file:
-            if not os.path.exists(args.file) and not args.file.lower().endswith(accepted_file_types):
-                print(f"Invalid file: {args.file}")
+            if not os.path.exists(args.file) and os.path.splitext(args.file)[1].lower() not in ACCEPTED_FILE_EXTS:
+                logger.error(f"Invalid file: {args.file}")
                 exit(1)
 
             # Extract text from the file
@@ -451,17 +1152,19 @@ if __name__ == "__main__":
                                              get_data=args.get_data)
         elif args.directory:
             if not os.path.isdir(args.directory):
-                print(f"Invalid directory: {args.directory}")
+                logger.error(f"Invalid directory: {args.directory}")
                 exit(1)
 
             # Get the list of image/pdf files in the directory
+            # scandir's entries already know whether they are files, so this does not stat every file again
             file_list = []
-            for file in os.listdir(args.directory):
-                if file.lower().endswith(accepted_file_types):
-                    file_path = os.path.join(args.directory, file)
-                    file_list.append(file_path)
+            with os.scandir(args.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and os.path.splitext(entry.name)[1].lower() in ACCEPTED_FILE_EXTS:
+                        file_list.append(entry.path)
 
             # Extract text from the list of files
             text_extractor.extract_from_list(file_list, output_dir=args.output, print_results=print_text,
-                                             get_data=args.get_data)
+                                             get_data=args.get_data, workers=args.workers or None,
+                                             api_variables=api_variables, force=args.force)
             
\ No newline at end of file
@@ -2,6 +2,11 @@
 # Project: Optical Character Recognition
 # This script contains functions to modify and filter tabular data extracted from tesseract.
 
+import csv
+import io
+import numpy as np
+from collections import defaultdict
+
 
 # Index positions for each element in a row
 # level= 0
@@ -17,6 +22,19 @@
 # conf = 10
 # text = 11
 
+def _read_table(data):
+    """Splits a tabular data string from tesseract into its header row and a list of the remaining rows."""
+    # Tesseract does not quote its fields, so quote characters are read as part of the text
+    reader = csv.reader(io.StringIO(data), delimiter='\t', quoting=csv.QUOTE_NONE)
+    table = [row for row in reader if row]
+    return table[0], table[1:]
+
+
+def _join_table(header, table):
+    """Joins a header row and a list of rows back into a tabular data string."""
+    return '\n'.join('\t'.join(row) for row in [header, *table])
+
+
 def filter_low_conf_extraction(data, conf_threshold = 10):
     """
     Parameters
@@ -39,26 +57,16 @@ def filter_low_conf_extraction(data, conf_threshold = 10):
     function filters out any text that has a confidence level below the specified threshold.
     """
     # Convert the string into a list of lists, where each inner list is a row from the tabular data, and each element
-    # in the inner list is an element from the row.
-    lines = data.split('\n')
-    table = [line.split('\t') for line in lines if line]
+    # in the inner list is an element from the row. The header row is kept separate from the table.
+    header, table = _read_table(data)
     
-    # Save the header row and remove it from the table
-    header = table[0]
-    table = table[1:]
-    
-    # Filter out any rows that have a confidence level below the threshold
-    filtered_table = [row for row in table if int(row[10]) >= conf_threshold]
-    
-    # Add the header row back to the filtered table
-    filtered_table.insert(0, header)
+    # Filter out any rows that have a confidence level below the threshold. The confidence column is parsed all at
+    # once, as floats so that the decimal confidences written by newer versions of tesseract are accepted as well.
+    conf = np.array([row[10] for row in table], dtype=np.float64)
+    filtered_table = [table[i] for i in np.flatnonzero(conf >= conf_threshold)]
 
-    # Convert the filtered table back into a string
-    filtered_lines = []
-    for row in filtered_table:
-        filtered_lines.append('\t'.join(row))
-    
-    filtered_text = '\n'.join(filtered_lines)
+    # Add the header row back and convert the filtered table back into a string
+    filtered_text = _join_table(header, filtered_table)
     
     return filtered_text 
 
@@ -194,6 +202,61 @@ def transform_element(item):
             return num
 
 
+def _close_pairs(table, left_distance, top_distance):
+    """Yields the index pairs of rows in the table (all from the same page) that are close to each other, in the
+    order a double loop comparing every row to each row after it would find them."""
+    # Pull the coordinate columns out of the rows in one pass
+    columns = np.array([(row[6], row[7], row[8]) for row in table], dtype=np.float64).reshape(-1, 3)
+    left, top, width = columns.T
+    right = left + width
+
+    # Compare each row against every row after it at once, rather than one pair at a time
+    for i in range(len(table) - 1):
+        rest_left, rest_top, rest_right = left[i+1:], top[i+1:], right[i+1:]
+        # Same measurement as left_is_close: the gap after whichever of the two words is leftmost
+        gap = np.abs(np.where(left[i] < rest_left, right[i] - rest_left, rest_right - left[i]))
+        close = (np.abs(rest_top - top[i]) <= top_distance) & (gap <= left_distance)
+        for j in np.flatnonzero(close):
+            yield i, i + 1 + int(j)
+
+
+def _realign_page(table, left_distance, top_distance):
+    """Combines the close rows of a single page until no more rows can be combined, and returns the new rows."""
+    # Keep track of whether or not any changes were made in the latest 
+    # iteration. Initialize to True so the while-loop will start.
+    modified = True
+    # Continue realigning the text until no changes are made
+    while modified:
+        # Reset to false for beginning of loop
+        modified = False
+        # Each row keeps its position in the table for the whole pass. A row that gets combined has its slot replaced
+        # and the row it was combined with has its slot emptied, so a row is still available only while its slot
+        # holds it.
+        slots = table.copy()
+        # Compare every row to every other row only once. Do not compare a row 
+        # to itself. Only the pairs of rows that are 'close' are returned.
+        for index1, index2 in _close_pairs(table, left_distance, top_distance):
+            modified = True # Changes have been made
+            item1 = table[index1]
+            item2 = table[index2]
+            # Ensure that both lines are still in the realigned table
+            if slots[index1] is not item1 or slots[index2] is not item2:
+                # At least one of the lines were removed
+                continue
+
+            # Ensure that we combine the text in the right order
+            if int(item1[6]) < int(item2[6]):
+                slots[index1] = combine_lines(item1, item2)
+                slots[index2] = None
+            else:
+                slots[index2] = combine_lines(item1, item2)
+                slots[index1] = None
+        # Update the table to the realigned rows, so that we can keep realigning until completion
+        table = [row for row in slots if row is not None]
+
+    return table
+
+
 def realign_text(data, left_distance, top_distance):
     """
     Parameters
@@ -214,76 +277,29 @@ def realign_text(data, left_distance, top_distance):
     -----------
     This function iterates over a string of tabular data extracted from tesseract and combines words that are
     considered 'close' to each other. It uses the left_distance and top_distance parameters to determine if two words
-    are close enough to be combined into a single line. The pages of the lines are also checked to make sure that two
+    are close enough to be combined into a single line. The lines are grouped by page first to make sure that two
     words on different pages are not combined. It will iterate over the data as many times as necessary to ensure that
     all lines were realigned. It then returns the realigned tabular data string.
     """
     # Convert the string into a list of lists, where each inner list is a row from the tabular data, and each element
-    # in the inner list is an element from the row.
-    lines = data.split('\n')
-    table = [line.split('\t') for line in lines if line]
-    
-    # Save the header row and remove it from the table
-    header = table[0]
-    table = table[1:]
+    # in the inner list is an element from the row. The header row is kept separate from the table.
+    header, table = _read_table(data)
     
     # Convert the elements of each list in the table to the correct data type
     table = [[transform_element(item) for item in row] for row in table]
     
-    # Copy
-    realigned = table.copy()
-    # Keep track of whether or not any changes were made in the latest 
-    # iteration. Initialize to True so the while-loop will start.
-    modified = True
-    # Continue realigning the text until no changes are made
-    while modified:
-        # Reset to false for beginning of loop
-        modified = False
-        # Compare every row to every other row only once. Do not compare a row 
-        # to itself
-        for index, item1 in enumerate(table):
-            for item2 in table[index+1:]:
-                # Check that the page of the two words are the same
-                if item1[1] != item2[1]:
-                    continue
-                
-                # Check if the two rows being compared are 'close'
-                if top_is_close(item1, item2, top_distance) and left_is_close(item1, item2, left_distance):
-                    # The realigned list is going to become shorter, so we need to
-                    # ensure that the item we are comparing is still in the
-                    # realigned list.
-                    try:
-                        modified = True # Changes have been made
-                        # Get the positions of the two lines of text that will be
-                        # combined
-                        first_pos = realigned.index(item1)
-                        second_pos = realigned.index(item2)
-                    except ValueError:
-                        # At least one of the lines were removed
-                        continue
-
-                    # Ensure that we combine the text in the right order
-                    if int(item1[6]) < int(item2[6]):
-                        realigned[first_pos] = combine_lines(item1, item2)
-                        realigned.pop(second_pos)
-                    else:
-                        realigned[second_pos] = combine_lines(item1, item2)
-                        realigned.pop(first_pos)
-        # Update the table to the realigned list, so that we can keep realigning until completion
-        table = realigned.copy()
+    # Words on different pages are never combined, so realign each page on its own. This only compares the words of
+    # a page with each other, and the pages are kept in the order they first appear in.
+    pages = defaultdict(list)
+    for row in table:
+        pages[row[1]].append(row)
+    table = [row for page in pages.values() for row in _realign_page(page, left_distance, top_distance)]
         
     # Convert all elements in every row back to strings
     table = [[str(item) for item in row] for row in table]
                 
-    # Add the header row back to the filtered table
-    table.insert(0, header)
-
-    # Convert the filtered table back into a string
-    realigned_lines = []
-    for row in table:
-        realigned_lines.append('\t'.join(row))
-    
-    realigned_text = '\n'.join(realigned_lines)
+    # Add the header row back and convert the realigned table back into a string
+    realigned_text = _join_table(header, table)
     
     return realigned_text
     
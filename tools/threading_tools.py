@@ -0,0 +1,37 @@
+# Author: Cody Sloan
+# Project: Optical Character Recognition
+# This script contains the helpers used by the background reader and writer threads of the text extraction and image
+# cleaning pipelines.
+
+import queue
+
+
+def put_until_stopped(item_queue, item, stop):
+    """Puts item in item_queue, waiting for room in the queue for as long as it takes, unless the threading.Event stop
+    is set first. Returns whether the item was put in the queue."""
+    # Wait for room in the queue, but give up if the items are no longer being taken out of it
+    while not stop.is_set():
+        try:
+            item_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def write_queued_items(write_queue, write_item, write_errors):
+    """Calls write_item(*item) for every item put in write_queue until None is received, to be used as the target of a
+    writer thread. The first exception raised by write_item is stored in write_errors, to be raised again by the thread
+    putting items in the queue. The remaining items are still taken out of the queue but discarded, so that thread is
+    never blocked, whatever the error was."""
+    while True:
+        item = write_queue.get()
+        if item is None:
+            return
+        if write_errors:
+            continue
+
+        try:
+            write_item(*item)
+        except Exception as error:
+            write_errors.append(error)